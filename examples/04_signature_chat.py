@@ -7,11 +7,45 @@ This example demonstrates how to:
 3. Create professional layouts with flexbox
 """
 
-from dash import html
+from dash import callback_context, html
 from dash_ai_chat import DashAIChat
 
 
 class SignatureChat(DashAIChat):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        # The "Sincerely" block is the same for every message, so build it once
+        # and share it; Dash serializes each reference independently.
+        self._signature_footer = html.Div(
+            [
+                html.Div(
+                    [
+                        "Sincerely, ",
+                        html.A(
+                            "DashAIChat! 🤖",
+                            href="https://pypi.org/project/dash-ai-chat/",
+                            target="_blank",
+                        ),
+                    ],
+                    style={
+                        "font-style": "italic",
+                        "margin-bottom": "5px",
+                    },
+                ),
+                html.Code(
+                    "pip install dash-ai-chat",
+                    style={
+                        "background-color": "#f8f9fa",
+                        "padding": "2px 4px",
+                        "border-radius": "3px",
+                        "font-size": "0.8em",
+                    },
+                ),
+            ],
+            style={"text-align": "right"},
+        )
+
     def get_token_usage_list(self, user_id, conversation_id):
         """Extract token usage from each API response."""
         responses_file = (
@@ -37,8 +71,6 @@ class SignatureChat(DashAIChat):
         return usage_list
 
     def format_messages(self, messages):
-        from dash import callback_context, html
-
         formatted = super().format_messages(messages)
 
         # Extract user and conversation from URL (e.g., /user123/001)
@@ -52,81 +84,53 @@ class SignatureChat(DashAIChat):
         else:
             token_usage_list = []
 
+        n_usages = len(token_usage_list)
         assistant_index = 0
         for msg_index, message in enumerate(messages):
-            if message["role"] == "assistant":
-                token_display = (
-                    token_usage_list[assistant_index]
-                    if assistant_index < len(token_usage_list)
-                    else ""
-                )
-                assistant_index += 1
-
-                signature = html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.Div(
-                                    token_display,
-                                    style={
-                                        "font-family": "monospace",
-                                        "font-size": "0.95em",
-                                        "color": "#333",
-                                        "font-weight": "500",
-                                        "align-self": "flex-end",
-                                    },
-                                )
-                                if token_display
-                                else None,
-                                html.Div(
-                                    [
-                                        html.Div(
-                                            [
-                                                "Sincerely, ",
-                                                html.A(
-                                                    "DashAIChat! 🤖",
-                                                    href="https://pypi.org/project/dash-ai-chat/",
-                                                    target="_blank",
-                                                ),
-                                            ],
-                                            style={
-                                                "font-style": "italic",
-                                                "margin-bottom": "5px",
-                                            },
-                                        ),
-                                        html.Code(
-                                            "pip install dash-ai-chat",
-                                            style={
-                                                "background-color": "#f8f9fa",
-                                                "padding": "2px 4px",
-                                                "border-radius": "3px",
-                                                "font-size": "0.8em",
-                                            },
-                                        ),
-                                    ],
-                                    style={"text-align": "right"},
-                                ),
-                            ],
-                            style={
-                                "display": "flex",
-                                "justify-content": "space-between",
-                                "align-items": "flex-end",
-                                "margin-top": "15px",
-                                "padding-bottom": "10px",
-                                "border-bottom": "1px solid #eee",
-                                "color": "#666",
-                            },
-                        ),
-                        html.Br(),
-                    ]
-                )
-
-                # Append the signature to the children of the formatted assistant message
-                # (Assumes the first child is the Markdown message)
-                if hasattr(formatted[msg_index], "children") and isinstance(
-                    formatted[msg_index].children, list
-                ):
-                    formatted[msg_index].children.append(signature)
+            if message["role"] != "assistant":
+                continue
+            token_display = (
+                token_usage_list[assistant_index] if assistant_index < n_usages else ""
+            )
+            assistant_index += 1
+
+            signature = html.Div(
+                [
+                    html.Div(
+                        [
+                            html.Div(
+                                token_display,
+                                style={
+                                    "font-family": "monospace",
+                                    "font-size": "0.95em",
+                                    "color": "#333",
+                                    "font-weight": "500",
+                                    "align-self": "flex-end",
+                                },
+                            )
+                            if token_display
+                            else None,
+                            self._signature_footer,
+                        ],
+                        style={
+                            "display": "flex",
+                            "justify-content": "space-between",
+                            "align-items": "flex-end",
+                            "margin-top": "15px",
+                            "padding-bottom": "10px",
+                            "border-bottom": "1px solid #eee",
+                            "color": "#666",
+                        },
+                    ),
+                    html.Br(),
+                ]
+            )
+
+            # Append the signature to the children of the formatted assistant message
+            # (Assumes the first child is the Markdown message)
+            children = getattr(formatted[msg_index], "children", None)
+            if type(children) is list:
+                children.append(signature)
 
         return formatted
 
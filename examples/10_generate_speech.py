@@ -4,20 +4,55 @@ Text-to-Speech Chat Example
 Demonstrates how to extend DashAIChat with custom functionality.
 This example shows how easy it is to add text-to-speech capabilities
 using the provider pattern and custom message formatting.
+
+Speech is generated in a background thread so the chat callback returns
+right away. The thread saves the result itself; a polling interval only
+re-renders the chat once the placeholder has been replaced on disk.
+A placeholder whose job died with its process (restart, worker crash) is
+marked failed once it is older than SPEECH_TIMEOUT, so polling stops.
 """
 
+import functools
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import openai
-from dash import html
+from dash import ALL, Input, Output, State, dcc, html, no_update
 from dash_ai_chat import DashAIChat
+from flask import send_from_directory
+
+AUDIO_ROOT = os.path.join(os.getcwd(), "chat_data")
+AUDIO_STYLE = {"width": "100%", "margin-top": "10px"}
+# Seconds before a placeholder with no live job in this process is given up on
+SPEECH_TIMEOUT = 300
+
+
+@functools.lru_cache(maxsize=4096)
+def audio_player(audio_url):
+    """Audio player and separators for one file, shared across renders."""
+    return (
+        html.Audio(controls=True, src=audio_url, style=AUDIO_STYLE),
+        html.Br(),
+        html.Hr(),
+    )
 
 
 class OpenAITextToSpeech:
     """TTS provider following the same 4-method interface as chat providers."""
 
+    def __init__(self):
+        self._client = None
+
     def client_factory(self):
-        return openai.OpenAI()
+        # Reuse one client so its keep-alive connection pool survives across turns
+        if self._client is None:
+            self._client = openai.OpenAI()
+        return self._client
 
     def call(self, client, text, model="gpt-4o-mini-tts", voice="alloy", **kwargs):
         return client.audio.speech.with_streaming_response.create(
@@ -36,41 +71,150 @@ class SpeechGeneratorChat(DashAIChat):
         super().__init__(**kwargs)
 
         # Add TTS provider to the registry
-        self.AI_REGISTRY["openai:tts"] = OpenAITextToSpeech()
+        self._tts_provider = OpenAITextToSpeech()
+        self.AI_REGISTRY["openai:tts"] = self._tts_provider
+
+        # Log a repr of each TTS response context to raw_api_responses.jsonl
+        self.debug_log_raw = False
+
+        # Audio directories already created, so mkdir runs once per conversation
+        self._audio_dirs = set()
+
+        # Audio files already seen on disk, so renders skip the exists() stat
+        self._audio_files = set()
+
+        # Last (messages key, rendered children), so identical re-renders are free
+        self._last_render = (None, None)
+
+        # TTS calls run off the callback thread and write their own results
+        self._tts_executor = ThreadPoolExecutor(max_workers=8)
+
+        # pending_ids of jobs running in this process; a placeholder missing
+        # from here may have lost its job to a restart
+        self._speech_jobs = set()
+
+        # One lock per conversation, so the TTS thread and the chat callback
+        # never interleave their read-modify-write of messages.json
+        self._convo_locks = {}
+        self._convo_locks_guard = threading.Lock()
 
         # Enable serving audio files to the browser
         self._register_static_file_serving()
+        self._register_speech_callbacks()
+
+    def default_layout(self):
+        layout = super().default_layout()
+        layout.children.extend(
+            [
+                dcc.Interval(id="speech_poll_interval", interval=500, disabled=True),
+                dcc.Store(id="speech_ready_store"),
+            ]
+        )
+        return layout
+
+    def _convo_lock(self, user_id, convo_id):
+        with self._convo_locks_guard:
+            return self._convo_locks.setdefault((user_id, convo_id), threading.Lock())
+
+    def add_message(self, user_id, conversation_id, message):
+        with self._convo_lock(user_id, conversation_id):
+            super().add_message(user_id, conversation_id, message)
+
+    def _register_speech_callbacks(self):
+        # Each rendered placeholder carries a hidden marker whose id names its
+        # conversation, so polling works for any URL and on any worker
+        pending_markers = State({"type": "pending-speech", "index": ALL}, "id")
+
+        @self.callback(
+            Output("speech_poll_interval", "disabled"),
+            Input("chat_area_div", "children"),
+            pending_markers,
+        )
+        def toggle_speech_polling(chat_children, markers):
+            return not markers
+
+        # Polling writes to a store outside dcc.Loading so idle polls don't
+        # flash the spinner; the chat area is only re-rendered when audio lands.
+        @self.callback(
+            Output("speech_ready_store", "data"),
+            Input("speech_poll_interval", "n_intervals"),
+            pending_markers,
+            prevent_initial_call=True,
+        )
+        def collect_finished_speech(n_intervals, markers):
+            for marker in markers:
+                pending_id = marker["index"]
+                user_id, convo_id, _ = pending_id.rsplit("|", 2)
+                messages = self.load_messages(user_id, convo_id)
+                msg = next(
+                    (m for m in messages if m.get("pending_id") == pending_id), None
+                )
+                if msg is None:
+                    return [user_id, convo_id, n_intervals]
+                age = time.time() - msg.get("pending_since", 0)
+                if pending_id not in self._speech_jobs and age > SPEECH_TIMEOUT:
+                    self._expire_speech(user_id, convo_id, pending_id)
+                    return [user_id, convo_id, n_intervals]
+            return no_update
+
+        @self.callback(
+            Output("chat_area_div", "children", allow_duplicate=True),
+            Input("speech_ready_store", "data"),
+            prevent_initial_call=True,
+        )
+        def show_finished_speech(ready):
+            user_id, convo_id, _ = ready
+            return self.format_messages(self.load_messages(user_id, convo_id))
 
     def _register_static_file_serving(self):
         @self.server.route("/chat_data/<path:filename>")
         def serve_audio_files(filename):
-            import os
-
-            from flask import send_from_directory
-
-            return send_from_directory(os.path.join(os.getcwd(), "chat_data"), filename)
+            # conditional=True answers Range requests so <audio> can seek and
+            # start playing before the whole file is downloaded
+            response = send_from_directory(
+                AUDIO_ROOT, filename, conditional=True, max_age=3600
+            )
+            # Speech files are named by a hash of their inputs, so a URL's
+            # content never changes and browsers/CDNs may cache it forever
+            if Path(filename).name.startswith("speech_"):
+                response.headers["Cache-Control"] = (
+                    "public, max-age=31536000, immutable"
+                )
+            return response
 
     def generate_speech(self, user_id: str, conversation_id: str, text: str) -> Path:
-        audio_dir = self._ensure_convo_dir(user_id, conversation_id) / "audio"
-        audio_dir.mkdir(exist_ok=True)
+        audio_dir = self._get_convo_dir(user_id, conversation_id) / "audio"
+        if audio_dir not in self._audio_dirs:
+            audio_dir.mkdir(parents=True, exist_ok=True)
+            self._audio_dirs.add(audio_dir)
 
-        import time
-
-        timestamp = str(int(time.time() * 1000))
-        speech_file_path = audio_dir / f"speech_{timestamp}.mp3"
+        # Same text gives the same file, so repeats skip the API call entirely
+        digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        speech_file_path = audio_dir / f"speech_{digest}.mp3"
+        if speech_file_path.exists():
+            return speech_file_path
 
         # Use the TTS provider like any other AI provider
-        tts_provider = self.AI_REGISTRY["openai:tts"]
+        tts_provider = self._tts_provider
         client = tts_provider.client_factory()
         response_context = tts_provider.call(client, text)
 
-        try:
-            self.append_raw_response(user_id, conversation_id, str(response_context))
-        except Exception:
-            pass
+        if self.debug_log_raw:
+            self.append_raw_response(user_id, conversation_id, repr(response_context))
 
-        with response_context as response:
-            response.stream_to_file(speech_file_path)
+        # Write chunks as they arrive instead of waiting for the whole utterance.
+        # Each request gets its own temp file, and the rename keeps a partial
+        # download from ever looking like a cache hit.
+        partial_path = audio_dir / f".{uuid.uuid4().hex}.part"
+        try:
+            with response_context as response, open(partial_path, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size=4096):
+                    f.write(chunk)
+            # An identical request may have finished first; its file is as good
+            if not speech_file_path.exists():
+                os.replace(partial_path, speech_file_path)
+        finally:
+            partial_path.unlink(missing_ok=True)
 
         return speech_file_path
 
@@ -90,54 +234,103 @@ class SpeechGeneratorChat(DashAIChat):
         user_msg = {"role": "user", "content": user_message}
         self.add_message(user_id, convo_id, user_msg)
 
-        try:
-            speech_file_path = self.generate_speech(user_id, convo_id, user_message)
-
-            # Store the audio file path for display
-            assistant_msg = {
-                "role": "assistant",
-                "content": "",
-                "audio_file": str(speech_file_path),
-            }
-            self.add_message(user_id, convo_id, assistant_msg)
-
-        except Exception as e:
-            error_msg = {
-                "role": "assistant",
-                "content": f"❌ Failed to generate speech: {str(e)}",
-            }
-            self.add_message(user_id, convo_id, error_msg)
+        # Placeholder until the TTS thread fills in the audio file. It is saved
+        # before the job starts so the thread always finds it to replace.
+        pending_id = f"{user_id}|{convo_id}|{uuid.uuid4().hex}"
+        assistant_msg = {
+            "role": "assistant",
+            "content": "⏳ Generating speech...",
+            "pending_id": pending_id,
+            "pending_since": time.time(),
+        }
+        self.add_message(user_id, convo_id, assistant_msg)
+
+        self._speech_jobs.add(pending_id)
+        future = self._tts_executor.submit(
+            self.generate_speech, user_id, convo_id, user_message
+        )
+        future.add_done_callback(
+            functools.partial(self._complete_speech, user_id, convo_id, pending_id)
+        )
 
         return convo_id
 
+    def _complete_speech(self, user_id, convo_id, pending_id, future):
+        with self._convo_lock(user_id, convo_id):
+            messages = self.load_messages(user_id, convo_id)
+            self._speech_jobs.discard(pending_id)
+            for msg in messages:
+                if msg.get("pending_id") == pending_id:
+                    del msg["pending_id"]
+                    msg.pop("pending_since", None)
+                    try:
+                        # Store the audio file path for display
+                        speech_file_path = future.result()
+                        msg["audio_file"] = str(speech_file_path)
+                        msg["audio_url"] = f"/{speech_file_path}"
+                        msg["content"] = ""
+                    except Exception as e:
+                        msg["content"] = f"❌ Failed to generate speech: {str(e)}"
+            self.save_messages(user_id, convo_id, messages)
+
+    def _expire_speech(self, user_id, convo_id, pending_id):
+        with self._convo_lock(user_id, convo_id):
+            # Re-check under the lock: the job may have just finished
+            if pending_id in self._speech_jobs:
+                return
+            messages = self.load_messages(user_id, convo_id)
+            for msg in messages:
+                if msg.get("pending_id") == pending_id:
+                    del msg["pending_id"]
+                    msg.pop("pending_since", None)
+                    msg["content"] = "❌ Failed to generate speech: timed out"
+            self.save_messages(user_id, convo_id, messages)
+
     def format_messages(self, messages):
+        # Keyed on content, not identity, so different users never share a render
+        key = tuple(
+            (m["role"], m["content"], m.get("audio_file"), m.get("pending_id"))
+            for m in messages
+        )
+        cached_key, cached_render = self._last_render
+        if key == cached_key:
+            return cached_render
+
         # Start with the default message formatting
         formatted = super().format_messages(messages)
 
         # Add audio players for messages that have audio files
+        n_formatted = len(formatted)
         for i, msg in enumerate(messages):
-            if msg["role"] == "assistant" and "audio_file" in msg and msg["audio_file"]:
-                audio_file_path = Path(msg["audio_file"])
-                if audio_file_path.exists():
-                    audio_url = f"/{audio_file_path}"
-                    audio_element = html.Audio(
-                        controls=True,
-                        src=audio_url,
-                        style={"width": "100%", "margin-top": "10px"},
-                    )
-
-                    # Append audio player to the message and hide copy icon
-                    if i < len(formatted):
-                        if hasattr(formatted[i], "children") and isinstance(
-                            formatted[i].children, list
-                        ):
-                            formatted[i].children.append(audio_element)
-                            formatted[i].children.append(html.Br())
-                            formatted[i].children.append(html.Hr())
-                            # Hide the copy icon for audio-only messages
-                            if len(formatted[i].children) > 3:
-                                formatted[i].children[1].style = {"display": "none"}
-
+            if i >= n_formatted or msg["role"] != "assistant":
+                continue
+
+            pending_id = msg.get("pending_id")
+            children = getattr(formatted[i], "children", None)
+            if pending_id and type(children) is list:
+                marker_id = {"type": "pending-speech", "index": pending_id}
+                children.append(html.Span(id=marker_id, hidden=True))
+                continue
+
+            audio_file = msg.get("audio_file")
+            if not audio_file:
+                continue
+
+            if audio_file not in self._audio_files:
+                if not Path(audio_file).exists():
+                    continue
+                self._audio_files.add(audio_file)
+
+            # Append audio player to the message and hide copy icon
+            if type(children) is list:
+                # Older messages were saved before audio_url was stored
+                audio_url = msg.get("audio_url") or f"/{audio_file}"
+                children.extend(audio_player(audio_url))
+                # Hide the copy icon for audio-only messages
+                if len(children) > 3:
+                    children[1].style = {"display": "none"}
+
+        self._last_render = (key, formatted)
         return formatted
 
 
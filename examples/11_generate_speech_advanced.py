@@ -24,12 +24,173 @@ The result: A fully functional text-to-speech chat with configurable models, voi
 speed, format, and advanced instructions - all with minimal code!
 """
 
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import uuid
 from pathlib import Path
+from urllib.parse import unquote
 
 import dash_bootstrap_components as dbc
 import openai
-from dash import Input, Output, State, html
+from dash import Input, Output, dcc, html
 from dash_ai_chat import DashAIChat
+from flask import request, send_from_directory
+
+AUDIO_ROOT = os.path.join(os.getcwd(), "chat_data")
+AUDIO_STYLE = {"width": "100%", "margin-top": "10px"}
+
+
+@functools.lru_cache(maxsize=4096)
+def audio_player(audio_url):
+    """Audio player and separators for one file, shared across renders."""
+    return (
+        html.Audio(controls=True, src=audio_url, style=AUDIO_STYLE),
+        html.Br(),
+        html.Hr(),
+    )
+
+
+# A single event loop in a daemon thread runs every TTS request, so concurrent
+# users share one AsyncOpenAI client and its connection pool
+_tts_loop = asyncio.new_event_loop()
+threading.Thread(target=_tts_loop.run_forever, daemon=True).start()
+
+# Seconds a chat callback waits for its audio before giving up on the request
+TTS_TIMEOUT = 120
+
+# The browser sends its TTS settings with every request in this cookie, so they
+# follow the person who changed them whatever user folder the chat lands in
+TTS_SETTINGS_COOKIE = "tts_settings"
+
+# TTS controls never change, so the accordion is built once at import time
+TTS_MODEL_OPTIONS = [
+    {
+        "label": "GPT-4o Mini TTS (supports instructions)",
+        "value": "gpt-4o-mini-tts",
+    },
+    {
+        "label": "TTS-1 (faster)",
+        "value": "tts-1",
+    },
+    {
+        "label": "TTS-1 HD (higher quality)",
+        "value": "tts-1-hd",
+    },
+]
+
+TTS_VOICE_OPTIONS = [
+    {"label": "Alloy", "value": "alloy"},
+    {"label": "Ash", "value": "ash"},
+    {"label": "Ballad", "value": "ballad"},
+    {"label": "Coral", "value": "coral"},
+    {"label": "Echo", "value": "echo"},
+    {"label": "Fable", "value": "fable"},
+    {"label": "Nova", "value": "nova"},
+    {"label": "Onyx", "value": "onyx"},
+    {"label": "Sage", "value": "sage"},
+    {"label": "Shimmer", "value": "shimmer"},
+    {"label": "Verse", "value": "verse"},
+]
+
+TTS_FORMAT_OPTIONS = [
+    {"label": "MP3", "value": "mp3"},
+    {"label": "OPUS", "value": "opus"},
+    {"label": "AAC", "value": "aac"},
+    {"label": "FLAC", "value": "flac"},
+    {"label": "WAV", "value": "wav"},
+    {"label": "PCM", "value": "pcm"},
+]
+
+TTS_ACCORDION = dbc.Accordion(
+    [
+        dbc.AccordionItem(
+            [
+                dbc.Row(
+                    [
+                        dbc.Col(
+                            [
+                                html.Label("Model:", className="form-label"),
+                                dbc.Select(
+                                    id="tts_model_dropdown",
+                                    options=TTS_MODEL_OPTIONS,
+                                    value="gpt-4o-mini-tts",
+                                ),
+                            ],
+                            md=3,
+                        ),
+                        dbc.Col(
+                            [
+                                html.Label("Voice:", className="form-label"),
+                                dbc.Select(
+                                    id="tts_voice_dropdown",
+                                    options=TTS_VOICE_OPTIONS,
+                                    value="alloy",
+                                ),
+                            ],
+                            md=3,
+                        ),
+                        dbc.Col(
+                            [
+                                html.Label("Speed:", className="form-label"),
+                                dbc.Input(
+                                    id="tts_speed_slider",
+                                    type="number",
+                                    min=0.25,
+                                    max=4.0,
+                                    step=0.25,
+                                    value=1.0,
+                                    placeholder="0.25-4.0",
+                                    debounce=True,
+                                ),
+                            ],
+                            md=2,
+                        ),
+                        dbc.Col(
+                            [
+                                html.Label("Format:", className="form-label"),
+                                dbc.Select(
+                                    id="tts_format_dropdown",
+                                    options=TTS_FORMAT_OPTIONS,
+                                    value="mp3",
+                                ),
+                            ],
+                            md=2,
+                        ),
+                        dbc.Col(
+                            [
+                                html.Label(
+                                    "Instructions (GPT-4o Mini only):",
+                                    className="form-label",
+                                ),
+                                dbc.Input(
+                                    id="tts_instructions_input",
+                                    type="text",
+                                    placeholder="Voice control instructions...",
+                                    debounce=True,
+                                ),
+                            ],
+                            md=4,
+                        ),
+                    ],
+                    className="g-3",
+                ),
+            ],
+            title="🎛️ Advanced Options",
+            item_id="tts_settings",
+        )
+    ],
+    id="tts_accordion",
+    start_collapsed=True,
+    className="mb-3",
+    style={
+        "--bs-accordion-btn-bg": "var(--bs-info)",
+        "--bs-accordion-btn-color": "var(--bs-white)",
+    },
+)
 
 
 class OpenAITextToSpeech:
@@ -38,16 +199,28 @@ class OpenAITextToSpeech:
 
     This demonstrates how to extend DashAIChat with new AI capabilities:
     1. client_factory() - Create the API client
-    2. call() - Make the API request
+    2. call() - Make the API request (call_async() is the asyncio variant)
     3. extract() - Process the response
     4. format_messages() - Format for display (not used for TTS)
 
     Any provider following this pattern can be registered with DashAIChat.
     """
 
+    def __init__(self):
+        self._client = None
+        self._async_client = None
+
     def client_factory(self):
-        """Create and return an OpenAI client instance."""
-        return openai.OpenAI()
+        """Create an OpenAI client once and reuse it (and its connection pool)."""
+        if self._client is None:
+            self._client = openai.OpenAI()
+        return self._client
+
+    def async_client_factory(self):
+        """Create an AsyncOpenAI client once and reuse it on the TTS event loop."""
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI()
+        return self._async_client
 
     def call(self, client, text, model="gpt-4o-mini-tts", voice="alloy", **kwargs):
         """Make the TTS API call and return streaming response."""
@@ -55,6 +228,19 @@ class OpenAITextToSpeech:
             model=model, voice=voice, input=text, **kwargs
         )
 
+    async def call_async(
+        self, client, text, path, model="gpt-4o-mini-tts", voice="alloy", **kwargs
+    ):
+        """Make the TTS API call and stream the audio chunks into ``path``."""
+        async with client.audio.speech.with_streaming_response.create(
+            model=model, voice=voice, input=text, **kwargs
+        ) as response:
+            # Plain writes: a 4 KB write to the page cache costs less than a
+            # thread hand-off per chunk would
+            with open(path, "wb") as f:
+                async for chunk in response.iter_bytes(chunk_size=4096):
+                    f.write(chunk)
+
     def extract(self, response):
         """Return the response as-is for direct file streaming."""
         return response
@@ -69,16 +255,14 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
         super().__init__(**kwargs)
 
         # Register our custom TTS provider - this is how you extend DashAIChat
-        self.AI_REGISTRY["openai:tts"] = OpenAITextToSpeech()
-
-        # Store TTS settings for the current conversation
-        self._current_tts_settings = {
-            "model": "gpt-4o-mini-tts",
-            "voice": "alloy",
-            "speed": 1.0,
-            "response_format": "mp3",
-            "instructions": None,
-        }
+        self._tts_provider = OpenAITextToSpeech()
+        self.AI_REGISTRY["openai:tts"] = self._tts_provider
+
+        # Audio directories already created, so mkdir runs once per conversation
+        self._audio_dirs = set()
+
+        # Audio files already seen on disk, so renders skip the exists() stat
+        self._audio_files = set()
 
         # Allow browser to access audio files we generate
         self._register_static_file_serving()
@@ -101,11 +285,18 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
     def _register_static_file_serving(self):
         @self.server.route("/chat_data/<path:filename>")
         def serve_audio_files(filename):
-            import os
-
-            from flask import send_from_directory
-
-            return send_from_directory(os.path.join(os.getcwd(), "chat_data"), filename)
+            # conditional=True answers Range requests so <audio> can seek and
+            # start playing before the whole file is downloaded
+            response = send_from_directory(
+                AUDIO_ROOT, filename, conditional=True, max_age=3600
+            )
+            # Speech files are named by a hash of their inputs, so a URL's
+            # content never changes and browsers/CDNs may cache it forever
+            if Path(filename).name.startswith("speech_"):
+                response.headers["Cache-Control"] = (
+                    "public, max-age=31536000, immutable"
+                )
+            return response
 
     def input_area(self):
         """
@@ -113,133 +304,20 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
 
         This demonstrates the clean subclassing pattern:
         1. Get the default input area from the parent
-        2. Create the TTS accordion inline
+        2. Add the TTS accordion (built once at module level)
         3. Return both components in a container
         """
         # Get the default input area
         default_input = super().input_area()
 
-        # Create TTS accordion directly
-        tts_accordion = dbc.Accordion(
+        # Return both components - accordion and default input area - plus the
+        # store holding the settings that were last written to the cookie
+        return html.Div(
             [
-                dbc.AccordionItem(
-                    [
-                        dbc.Row(
-                            [
-                                dbc.Col(
-                                    [
-                                        html.Label("Model:", className="form-label"),
-                                        dbc.Select(
-                                            id="tts_model_dropdown",
-                                            options=[
-                                                {
-                                                    "label": "GPT-4o Mini TTS (supports instructions)",
-                                                    "value": "gpt-4o-mini-tts",
-                                                },
-                                                {
-                                                    "label": "TTS-1 (faster)",
-                                                    "value": "tts-1",
-                                                },
-                                                {
-                                                    "label": "TTS-1 HD (higher quality)",
-                                                    "value": "tts-1-hd",
-                                                },
-                                            ],
-                                            value="gpt-4o-mini-tts",
-                                        ),
-                                    ],
-                                    md=3,
-                                ),
-                                dbc.Col(
-                                    [
-                                        html.Label("Voice:", className="form-label"),
-                                        dbc.Select(
-                                            id="tts_voice_dropdown",
-                                            options=[
-                                                {"label": "Alloy", "value": "alloy"},
-                                                {"label": "Ash", "value": "ash"},
-                                                {"label": "Ballad", "value": "ballad"},
-                                                {"label": "Coral", "value": "coral"},
-                                                {"label": "Echo", "value": "echo"},
-                                                {"label": "Fable", "value": "fable"},
-                                                {"label": "Nova", "value": "nova"},
-                                                {"label": "Onyx", "value": "onyx"},
-                                                {"label": "Sage", "value": "sage"},
-                                                {
-                                                    "label": "Shimmer",
-                                                    "value": "shimmer",
-                                                },
-                                                {"label": "Verse", "value": "verse"},
-                                            ],
-                                            value="alloy",
-                                        ),
-                                    ],
-                                    md=3,
-                                ),
-                                dbc.Col(
-                                    [
-                                        html.Label("Speed:", className="form-label"),
-                                        dbc.Input(
-                                            id="tts_speed_slider",
-                                            type="number",
-                                            min=0.25,
-                                            max=4.0,
-                                            step=0.25,
-                                            value=1.0,
-                                            placeholder="0.25-4.0",
-                                        ),
-                                    ],
-                                    md=2,
-                                ),
-                                dbc.Col(
-                                    [
-                                        html.Label("Format:", className="form-label"),
-                                        dbc.Select(
-                                            id="tts_format_dropdown",
-                                            options=[
-                                                {"label": "MP3", "value": "mp3"},
-                                                {"label": "OPUS", "value": "opus"},
-                                                {"label": "AAC", "value": "aac"},
-                                                {"label": "FLAC", "value": "flac"},
-                                                {"label": "WAV", "value": "wav"},
-                                                {"label": "PCM", "value": "pcm"},
-                                            ],
-                                            value="mp3",
-                                        ),
-                                    ],
-                                    md=2,
-                                ),
-                                dbc.Col(
-                                    [
-                                        html.Label(
-                                            "Instructions (GPT-4o Mini only):",
-                                            className="form-label",
-                                        ),
-                                        dbc.Input(
-                                            id="tts_instructions_input",
-                                            type="text",
-                                            placeholder="Voice control instructions...",
-                                        ),
-                                    ],
-                                    md=4,
-                                ),
-                            ],
-                            className="g-3",
-                        ),
-                    ],
-                    title="🎛️ Advanced Options",
-                    item_id="tts_settings",
-                )
+                TTS_ACCORDION,
+                dcc.Store(id="tts_settings_store"),
+                default_input.children[0],
             ],
-            id="tts_accordion",
-            start_collapsed=True,
-            className="mb-3",
-            style={"--bs-accordion-btn-bg": "var(--bs-info)", "--bs-accordion-btn-color": "var(--bs-white)"},
-        )
-
-        # Return both components - accordion and default input area
-        return html.Div(
-            [tts_accordion, default_input.children[0]],
             className="col-lg-7 col-md-12 mx-auto",
         )
 
@@ -260,18 +338,10 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
         response_format: str = "mp3",
         instructions: str = None,
     ) -> Path:
-        audio_dir = self._ensure_convo_dir(user_id, conversation_id) / "audio"
-        audio_dir.mkdir(exist_ok=True)
-
-        import time
-
-        timestamp = str(int(time.time() * 1000))
-        # Use the selected format for the file extension
-        speech_file_path = audio_dir / f"speech_{timestamp}.{response_format}"
-
-        # Use the TTS provider like any other AI provider
-        tts_provider = self.AI_REGISTRY["openai:tts"]
-        client = tts_provider.client_factory()
+        audio_dir = self._get_convo_dir(user_id, conversation_id) / "audio"
+        if audio_dir not in self._audio_dirs:
+            audio_dir.mkdir(parents=True, exist_ok=True)
+            self._audio_dirs.add(audio_dir)
 
         # Build kwargs for the API call
         call_kwargs = {
@@ -285,10 +355,40 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
         if instructions and instructions.strip() and model == "gpt-4o-mini-tts":
             call_kwargs["instructions"] = instructions.strip()
 
-        response_context = tts_provider.call(client, text, **call_kwargs)
+        # Name the file by everything that shapes the audio, so identical
+        # requests reuse the existing file instead of calling the API again
+        key = f"{model}|{voice}|{speed}|{response_format}|"
+        key += f"{call_kwargs.get('instructions')}|{text}"
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        # Use the selected format for the file extension
+        speech_file_path = audio_dir / f"speech_{digest}.{response_format}"
+        if speech_file_path.exists():
+            return speech_file_path
 
-        with response_context as response:
-            response.stream_to_file(speech_file_path)
+        # Use the TTS provider like any other AI provider
+        tts_provider = self._tts_provider
+        client = tts_provider.async_client_factory()
+
+        # Run on the shared loop; this thread only waits for the file to be written.
+        # Each request gets its own temp file, and the rename keeps a partial
+        # download from ever looking like a cache hit.
+        # The timeout is applied on the loop: wait_for only raises once the
+        # cancelled request has closed its file, so the unlink below is final.
+        partial_path = audio_dir / f".{uuid.uuid4().hex}.part"
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(
+                tts_provider.call_async(client, text, partial_path, **call_kwargs),
+                TTS_TIMEOUT,
+            ),
+            _tts_loop,
+        )
+        try:
+            future.result()
+            # An identical request may have finished first; its file is as good
+            if not speech_file_path.exists():
+                os.replace(partial_path, speech_file_path)
+        finally:
+            partial_path.unlink(missing_ok=True)
 
         return speech_file_path
 
@@ -309,15 +409,15 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
         self.add_message(user_id, convo_id, user_msg)
 
         try:
-            # Use the current TTS settings from the callback
-            settings = getattr(self, "_current_tts_settings", {})
+            # Use the TTS settings of the browser that sent this message
+            settings = self.tts_settings()
             speech_file_path = self.generate_speech(
                 user_id,
                 convo_id,
                 user_message,
                 model=settings.get("model", "gpt-4o-mini-tts"),
                 voice=settings.get("voice", "alloy"),
-                speed=settings.get("speed", 1.0),
+                speed=float(settings.get("speed", 1.0)),
                 response_format=settings.get("response_format", "mp3"),
                 instructions=settings.get("instructions"),
             )
@@ -327,6 +427,7 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
                 "role": "assistant",
                 "content": "",
                 "audio_file": str(speech_file_path),
+                "audio_url": f"/{speech_file_path}",
             }
             self.add_message(user_id, convo_id, assistant_msg)
 
@@ -339,33 +440,43 @@ class AdvancedSpeechGeneratorChat(DashAIChat):
 
         return convo_id
 
+    def tts_settings(self):
+        """Return the TTS settings cookie of the current request, or {}."""
+        try:
+            raw = request.cookies.get(TTS_SETTINGS_COOKIE)
+        except RuntimeError:  # called outside a request, e.g. from a script
+            return {}
+        try:
+            settings = json.loads(unquote(raw)) if raw else {}
+        except ValueError:
+            return {}
+        return settings if isinstance(settings, dict) else {}
+
     def format_messages(self, messages):
         # Start with the default message formatting
         formatted = super().format_messages(messages)
 
         # Add audio players for messages that have audio files
+        n_formatted = len(formatted)
         for i, msg in enumerate(messages):
-            if msg["role"] == "assistant" and "audio_file" in msg and msg["audio_file"]:
-                audio_file_path = Path(msg["audio_file"])
-                if audio_file_path.exists():
-                    audio_url = f"/{audio_file_path}"
-                    audio_element = html.Audio(
-                        controls=True,
-                        src=audio_url,
-                        style={"width": "100%", "margin-top": "10px"},
-                    )
-
-                    # Append audio player to the message and hide copy icon
-                    if i < len(formatted):
-                        if hasattr(formatted[i], "children") and isinstance(
-                            formatted[i].children, list
-                        ):
-                            formatted[i].children.append(audio_element)
-                            formatted[i].children.append(html.Br())
-                            formatted[i].children.append(html.Hr())
-                            # Hide the copy icon for audio-only messages
-                            if len(formatted[i].children) > 3:
-                                formatted[i].children[1].style = {"display": "none"}
+            audio_file = msg.get("audio_file") if msg["role"] == "assistant" else None
+            if not audio_file or i >= n_formatted:
+                continue
+
+            if audio_file not in self._audio_files:
+                if not Path(audio_file).exists():
+                    continue
+                self._audio_files.add(audio_file)
+
+            # Append audio player to the message and hide copy icon
+            children = getattr(formatted[i], "children", None)
+            if type(children) is list:
+                # Older messages were saved before audio_url was stored
+                audio_url = msg.get("audio_url") or f"/{audio_file}"
+                children.extend(audio_player(audio_url))
+                # Hide the copy icon for audio-only messages
+                if len(children) > 3:
+                    children[1].style = {"display": "none"}
 
         return formatted
 
@@ -377,44 +488,31 @@ app = AdvancedSpeechGeneratorChat(
 )
 
 
-@app.callback(
-    Output("tts_model_dropdown", "id", allow_duplicate=True),  # Dummy output
-    [
-        Input("user_input_textarea", "n_submit"),
-    ],
-    [
-        State("tts_model_dropdown", "value"),
-        State("tts_voice_dropdown", "value"),
-        State("tts_speed_slider", "value"),
-        State("tts_format_dropdown", "value"),
-        State("tts_instructions_input", "value"),
-    ],
-    prevent_initial_call=True,
+# Runs in the browser on page load and whenever a control changes, so the
+# cookie always matches what the controls show, even after a reload
+app.clientside_callback(
+    f"""
+    function(model, voice, speed, format, instructions) {{
+        const settings = {{
+            model: model || "gpt-4o-mini-tts",
+            voice: voice || "alloy",
+            speed: speed || 1.0,
+            response_format: format || "mp3",
+            instructions: instructions || null,
+        }};
+        document.cookie = "{TTS_SETTINGS_COOKIE}="
+            + encodeURIComponent(JSON.stringify(settings))
+            + "; path=/; SameSite=Lax";
+        return settings;
+    }}
+    """,
+    Output("tts_settings_store", "data"),
+    Input("tts_model_dropdown", "value"),
+    Input("tts_voice_dropdown", "value"),
+    Input("tts_speed_slider", "value"),
+    Input("tts_format_dropdown", "value"),
+    Input("tts_instructions_input", "value"),
 )
-def store_tts_settings(
-    n_submit,
-    tts_model,
-    tts_voice,
-    tts_speed,
-    tts_format,
-    tts_instructions,
-):
-    """
-    Store TTS settings when user submits a message.
-
-    This callback fires every time the user presses Enter or clicks Send,
-    ensuring the latest TTS settings are available to the provider.
-    """
-    if n_submit:
-        # Update app instance with current TTS settings
-        app._current_tts_settings = {
-            "model": tts_model or "gpt-4o-mini-tts",
-            "voice": tts_voice or "alloy",
-            "speed": tts_speed or 1.0,
-            "response_format": tts_format or "mp3",
-            "instructions": tts_instructions,
-        }
-    return "tts_model_dropdown"  # Return the ID as dummy output
 
 
 if __name__ == "__main__":
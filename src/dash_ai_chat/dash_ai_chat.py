@@ -1,6 +1,8 @@
 import datetime
 import json
+import re
 import unicodedata
+import uuid
 from pathlib import Path
 from typing import Any, Dict, Iterator, List, Optional
 
@@ -9,8 +11,26 @@ from dash import ALL, Dash, Input, Output, State, callback_context, dcc, html, n
 
 from .providers import build_default_registry
 
+try:
+    import orjson
+except ImportError:  # optional speedup: pip install dash-ai-chat[orjson]
+    orjson = None
+
 
 class DashAIChat(Dash):
+    # Component IDs the built-in callbacks depend on; every layout must include them
+    REQUIRED_IDS = frozenset(
+        {
+            "burger_menu",
+            "sidebar_offcanvas",
+            "conversation_list",
+            "url",
+            "chat_area_div",
+            "user_input_textarea",
+            "new_chat_button",
+        }
+    )
+
     def __init__(
         self,
         base_dir,
@@ -29,15 +49,6 @@ class DashAIChat(Dash):
             __name__,
             **kwargs,
         )
-        self.required_ids = {
-            "burger_menu",
-            "sidebar_offcanvas",
-            "conversation_list",
-            "url",
-            "chat_area_div",
-            "user_input_textarea",
-            "new_chat_button",
-        }
         self.BASE_DIR = Path(base_dir)
         self.AI_REGISTRY = build_default_registry()
         self.provider_spec = provider_spec
@@ -47,6 +58,11 @@ class DashAIChat(Dash):
         self._register_callbacks()
         self._register_clientside_callbacks()
 
+    @property
+    def required_ids(self):
+        """Read-only alias of REQUIRED_IDS, kept for code written against it."""
+        return self.REQUIRED_IDS
+
     # --- Layout Components ---
     def header(self):
         """App header with navigation toggle button.
@@ -151,24 +167,26 @@ class DashAIChat(Dash):
         )
 
     def _validate_layout(self):
-        def collect_ids(component):
-            ids = set()
-            if hasattr(component, "id") and component.id:
-                ids.add(component.id)
-            if hasattr(component, "children"):
-                children = component.children
-                if isinstance(children, list):
-                    for child in children:
-                        ids |= collect_ids(child)
-                elif children is not None:
-                    ids |= collect_ids(children)
-            return ids
-
-        ids = collect_ids(self.layout)
-        missing = self.required_ids - ids
+        # Iterative walk: no recursion limit on deep custom layouts, and it
+        # stops as soon as every required ID has been seen
+        need = self.REQUIRED_IDS
+        found = set()
+        stack = [self.layout]
+        while stack and len(found) < len(need):
+            component = stack.pop()
+            component_id = getattr(component, "id", None)
+            if isinstance(component_id, str) and component_id in need:
+                found.add(component_id)
+            children = getattr(component, "children", None)
+            if isinstance(children, list):
+                stack.extend(children)
+            elif children is not None:
+                stack.append(children)
+
+        missing = need.difference(found)
         if missing:
             raise ValueError(
-                f"The following required component IDs are missing from the layout: {missing}"
+                f"The following required component IDs are missing from the layout: {set(missing)}"
             )
 
     def set_layout(self, layout):
@@ -259,25 +277,83 @@ class DashAIChat(Dash):
         provider_spec = provider_spec or self.provider_spec
         provider_model = provider_model or self.provider_model
 
-        if provider_spec not in self.AI_REGISTRY:
+        provider = self.AI_REGISTRY.get(provider_spec)
+        if provider is None:
             raise ValueError(f"Unknown provider spec: {provider_spec}")
         if not provider_model:
             raise ValueError("Model must be specified explicitly.")
 
-        provider = self.AI_REGISTRY[provider_spec]
         client = provider.client_factory()
         formatted_messages = provider.format_messages(messages)
         resp = provider.call(client, formatted_messages, provider_model, **kwargs)
         return resp.model_dump() if hasattr(resp, "model_dump") else resp
 
+    async def afetch_ai_response(
+        self,
+        messages: List[Dict],
+        provider_spec: Optional[str] = None,
+        provider_model: Optional[str] = None,
+        **kwargs,
+    ) -> Dict:
+        provider_spec = provider_spec or self.provider_spec
+        provider_model = provider_model or self.provider_model
+
+        provider = self.AI_REGISTRY.get(provider_spec)
+        if provider is None:
+            raise ValueError(f"Unknown provider spec: {provider_spec}")
+        if not provider_model:
+            raise ValueError("Model must be specified explicitly.")
+        if not hasattr(provider, "acall"):
+            raise ValueError(f"Provider does not support async calls: {provider_spec}")
+
+        # A fresh client per call: callers often run each turn in its own loop
+        # (asyncio.run), and pooled connections can't outlive the loop they use.
+        # So async calls never reuse connections, and each one pays a new TCP+TLS
+        # handshake; fetch_ai_response keeps its pool warm across turns.
+        client = provider.async_client_factory()
+        formatted_messages = provider.format_messages(messages)
+        try:
+            resp = await provider.acall(
+                client, formatted_messages, provider_model, **kwargs
+            )
+        finally:
+            await client.close()
+        return resp.model_dump() if hasattr(resp, "model_dump") else resp
+
+    def stream_ai_response(
+        self,
+        messages: List[Dict],
+        provider_spec: Optional[str] = None,
+        provider_model: Optional[str] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        # Not a generator itself, so bad arguments fail here rather than on first next()
+        provider_spec = provider_spec or self.provider_spec
+        provider_model = provider_model or self.provider_model
+
+        provider = self.AI_REGISTRY.get(provider_spec)
+        if provider is None:
+            raise ValueError(f"Unknown provider spec: {provider_spec}")
+        if not provider_model:
+            raise ValueError("Model must be specified explicitly.")
+        if not hasattr(provider, "call_stream"):
+            raise ValueError(f"Provider does not support streaming: {provider_spec}")
+
+        client = provider.client_factory()
+        formatted_messages = provider.format_messages(messages)
+        stream = provider.call_stream(
+            client, formatted_messages, provider_model, **kwargs
+        )
+        return provider.extract_stream(stream)
+
     def extract_assistant_content(
         self,
         raw_response: Dict,
         provider_spec: str = "openai:chat.completions",
     ) -> str:
-        if provider_spec not in self.AI_REGISTRY:
+        provider = self.AI_REGISTRY.get(provider_spec)
+        if provider is None:
             raise ValueError(f"Unknown provider spec: {provider_spec}")
-        provider = self.AI_REGISTRY[provider_spec]
         return provider.extract(raw_response)
 
     def update_convo(
@@ -316,8 +392,6 @@ class DashAIChat(Dash):
             State("user_input_textarea", "value"),
         )
         def handle_user_input(n_submit, pathname, value):
-            import uuid
-
             segments = (pathname or "/").strip("/").split("/")
             user_id = segments[0] if segments and segments[0] else str(uuid.uuid4())[:5]
             convo_id = segments[1] if len(segments) > 1 and segments[1] else None
@@ -352,8 +426,6 @@ class DashAIChat(Dash):
                     i for i, clicks in enumerate(convo_clicks) if clicks and clicks > 0
                 )
                 convo_id = f"{clicked_index + 1:03d}"
-                import re
-
                 new_path = re.sub(r"/[^/]*$", f"/{convo_id}", current_pathname or "/")
                 return False, new_path
             if "burger_menu" in trigger_id and burger_clicks:
@@ -365,8 +437,6 @@ class DashAIChat(Dash):
             Input("url", "pathname"),
         )
         def update_conversation_list(pathname):
-            import uuid
-
             if not pathname:
                 return []
             segments = pathname.strip("/").split("/")
@@ -400,8 +470,6 @@ class DashAIChat(Dash):
         )
         def handle_new_chat(n_clicks, current_pathname):
             if n_clicks:
-                import uuid
-
                 segments = (current_pathname or "/").strip("/").split("/")
                 user_id = (
                     segments[0] if segments and segments[0] else str(uuid.uuid4())[:5]
@@ -482,22 +550,37 @@ class DashAIChat(Dash):
         return path
 
     # --- File I/O ---
+    # The whole conversation is re-read and re-written on every turn, so use orjson
+    # when installed; both paths write UTF-8 JSON that either one can read back,
+    # and both turn non-str dict keys into strings
     def _read_json(self, path: Path) -> Any:
+        if orjson is not None:
+            return orjson.loads(path.read_bytes())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
 
     def _read_jsonl(self, path: Path) -> Iterator[Dict]:
+        loads = orjson.loads if orjson is not None else json.loads
         with open(path, "r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
                 if line:
-                    yield json.loads(line)
+                    yield loads(line)
 
     def _write_json(self, path: Path, data: Any) -> None:
+        if orjson is not None:
+            options = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            path.write_bytes(orjson.dumps(data, option=options))
+            return
         with open(path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
     def _append_jsonl(self, path: Path, entry: Dict) -> None:
+        if orjson is not None:
+            with open(path, "ab") as f:
+                options = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+                f.write(orjson.dumps(entry, option=options))
+            return
         with open(path, "a", encoding="utf-8") as f:
             f.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
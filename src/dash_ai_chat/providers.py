@@ -2,6 +2,13 @@
 
 Simple, minimal provider classes that show how easy customization is.
 Each provider implements the same 4-method interface: client_factory, call, extract, format_messages.
+Providers that support streaming also implement call_stream and extract_stream, which
+yields the reply text piece by piece as it arrives.
+Providers with an async SDK also implement async_client_factory and acall, for use
+from async callbacks. Async clients are built per call, since each one is tied to
+the event loop it runs on.
+SDKs are imported inside client_factory, so only the providers you use are ever loaded,
+and each provider builds its client once and reuses it (and its connection pool).
 
 Once you learn one provider, you've learned them all!
 
@@ -12,64 +19,212 @@ Example customization:
             return super().call(client, messages, model, **kwargs)
 """
 
+import functools
 import os
+import sys
+
+# Retries on rate limits, timeouts and 5xx errors, with exponential backoff, handled by
+# each SDK; callers should not wrap calls in retries of their own
+MAX_RETRIES = 3
+
+# API keys by env var name, read from the environment once and overridable at runtime
+_API_KEYS = {}
+
+
+def _api_key(env_var):
+    """Return the API key for env_var, reading the environment only on first use."""
+    key = _API_KEYS.get(env_var)
+    if key is None:
+        key = _API_KEYS[env_var] = os.environ[env_var]
+    return key
+
+
+def set_api_key(env_var, key):
+    """Override the API key for env_var; clients using it are rebuilt on next use."""
+    _API_KEYS[env_var] = key
+
+
+def _cached_client(provider, env_var, build):
+    """Return provider's client, calling build(key) only when the API key changes."""
+    key = _api_key(env_var)
+    if key != provider._client_key:
+        provider._client = build(key)
+        provider._client_key = key
+    return provider._client
+
+
+@functools.cache
+def _shared_http_client():
+    """One httpx connection pool shared by every httpx-based SDK client."""
+    import httpx
+
+    return httpx.Client(
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+
+
+# Canonical role strings: JSON-loaded roles are fresh objects that would each hash anew
+_ROLES = {role: sys.intern(role) for role in ("user", "assistant", "system", "tool")}
+
+
+def _role_content(history):
+    """Strip messages to role/content, returning history itself when already clean."""
+    if all(
+        type(m) is dict and len(m) == 2 and "role" in m and "content" in m
+        for m in history
+    ):
+        return history
+    return [
+        {"role": _ROLES.get(m["role"], m["role"]), "content": m["content"]}
+        for m in history
+    ]
 
 
 class OpenAIChatCompletions:
     """OpenAI chat completions provider."""
 
-    def client_factory(self):
-        """Create OpenAI client from OPENAI_API_KEY env var."""
-        from openai import OpenAI
+    # OpenAI-compatible providers subclass this and only change these
+    api_key_env = "OPENAI_API_KEY"
+    base_url = None
+    default_headers = None
+
+    # Class-level defaults, so subclasses with their own __init__ need not call super()
+    _client = None
+    _client_key = None
 
-        return OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    def client_factory(self):
+        """Create OpenAI client from the api_key_env env var (OPENAI_API_KEY)."""
+
+        def build(key):
+            from openai import OpenAI
+
+            return OpenAI(
+                api_key=key,
+                base_url=self.base_url,
+                default_headers=self.default_headers,
+                max_retries=MAX_RETRIES,
+                http_client=_shared_http_client(),
+            )
+
+        return _cached_client(self, self.api_key_env, build)
+
+    def async_client_factory(self):
+        """Create a new AsyncOpenAI client with client_factory's key and endpoint.
+
+        Not cached: its connection pool belongs to the event loop it first runs on,
+        so each call opens new connections.
+        """
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=_api_key(self.api_key_env),
+            base_url=self.base_url,
+            default_headers=self.default_headers,
+            max_retries=MAX_RETRIES,
+        )
 
     def call(self, client, messages, model, **kwargs):
         """Call OpenAI chat completions API."""
         return client.chat.completions.create(model=model, messages=messages, **kwargs)
 
+    async def acall(self, client, messages, model, **kwargs):
+        """Call OpenAI chat completions API without blocking the event loop."""
+        return await client.chat.completions.create(
+            model=model, messages=messages, **kwargs
+        )
+
     def extract(self, response):
         """Extract message content from response."""
         return response["choices"][0]["message"]["content"]
 
+    def call_stream(self, client, messages, model, **kwargs):
+        """Call OpenAI chat completions API, streaming the response."""
+        return client.chat.completions.create(
+            model=model, messages=messages, stream=True, **kwargs
+        )
+
+    def extract_stream(self, response):
+        """Yield message content deltas from a streamed response."""
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     def format_messages(self, history):
         """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+        return _role_content(history)
 
 
 class GeminiChatCompletions:
     """Google Gemini chat completions provider."""
 
+    _client = None
+    _client_key = None
+
     def client_factory(self):
         """Create Gemini client from GEMINI_API_KEY env var."""
-        from google import genai
 
-        return genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+        def build(key):
+            from google import genai
+
+            return genai.Client(
+                api_key=key,
+                http_options={"retry_options": {"attempts": MAX_RETRIES + 1}},
+            )
+
+        return _cached_client(self, "GEMINI_API_KEY", build)
 
     def call(self, client, messages, model, **kwargs):
-        """Call Gemini chat completions API."""
-        chat = client.chats.create(model=model)
-        # Get the last message (current user input)
-        current_message = messages[-1]["content"]
-        return chat.send_message(current_message)
+        """Call Gemini generate_content API with the full conversation."""
+        return client.models.generate_content(model=model, contents=messages, **kwargs)
 
     def extract(self, response):
         """Extract message content from response."""
         return response["candidates"][0]["content"]["parts"][0]["text"]
 
     def format_messages(self, history):
-        """Format message history for API (handled in call method)."""
-        return history
+        """Format message history for API (Gemini calls the assistant "model")."""
+        return [
+            {
+                "role": "model" if m["role"] == "assistant" else "user",
+                "parts": [{"text": m["content"]}],
+            }
+            for m in history
+        ]
 
 
 class AnthropicChatCompletions:
     """Anthropic Claude chat completions provider."""
 
+    _client = None
+    _client_key = None
+
     def client_factory(self):
         """Create Anthropic client from ANTHROPIC_API_KEY env var."""
-        from anthropic import Anthropic
 
-        return Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+        def build(key):
+            from anthropic import Anthropic
+
+            return Anthropic(
+                api_key=key,
+                max_retries=MAX_RETRIES,
+                http_client=_shared_http_client(),
+            )
+
+        return _cached_client(self, "ANTHROPIC_API_KEY", build)
+
+    def async_client_factory(self):
+        """Create a new AsyncAnthropic client with client_factory's key and endpoint.
+
+        Not cached: its connection pool belongs to the event loop it first runs on,
+        so each call opens new connections.
+        """
+        from anthropic import AsyncAnthropic
+
+        return AsyncAnthropic(
+            api_key=_api_key("ANTHROPIC_API_KEY"),
+            max_retries=MAX_RETRIES,
+        )
 
     def call(self, client, messages, model, **kwargs):
         """Call Anthropic chat completions API."""
@@ -78,23 +233,45 @@ class AnthropicChatCompletions:
         )
         return response
 
+    async def acall(self, client, messages, model, **kwargs):
+        """Call Anthropic messages API without blocking the event loop."""
+        return await client.messages.create(
+            model=model, messages=messages, max_tokens=1000, **kwargs
+        )
+
     def extract(self, response):
         """Extract message content from response."""
         return response["content"][0]["text"]
 
+    def call_stream(self, client, messages, model, **kwargs):
+        """Call Anthropic messages API, streaming the response."""
+        return client.messages.create(
+            model=model, messages=messages, max_tokens=1000, stream=True, **kwargs
+        )
+
+    def extract_stream(self, response):
+        """Yield text deltas from a streamed response."""
+        for event in response:
+            if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
+
     def format_messages(self, history):
         """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+        return _role_content(history)
 
 
 class OllamaChat:
     """Ollama chat provider."""
 
+    _client = None
+
     def client_factory(self):
         """Create Ollama client."""
-        from ollama import Client
+        if self._client is None:
+            from ollama import Client
 
-        return Client()
+            self._client = Client()
+        return self._client
 
     def call(self, client, messages, model, **kwargs):
         """Call Ollama chat API."""
@@ -106,39 +283,88 @@ class OllamaChat:
 
     def format_messages(self, history):
         """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+        return _role_content(history)
 
 
 class GroqChatCompletions:
     """Groq chat completions provider."""
 
+    _client = None
+    _client_key = None
+
     def client_factory(self):
         """Create Groq client from GROQ_API_KEY env var."""
-        from groq import Groq
 
-        return Groq(api_key=os.environ["GROQ_API_KEY"])
+        def build(key):
+            from groq import Groq
+
+            return Groq(
+                api_key=key,
+                max_retries=MAX_RETRIES,
+                http_client=_shared_http_client(),
+            )
+
+        return _cached_client(self, "GROQ_API_KEY", build)
+
+    def async_client_factory(self):
+        """Create a new AsyncGroq client with client_factory's key and endpoint.
+
+        Not cached: its connection pool belongs to the event loop it first runs on,
+        so each call opens new connections.
+        """
+        from groq import AsyncGroq
+
+        return AsyncGroq(
+            api_key=_api_key("GROQ_API_KEY"),
+            max_retries=MAX_RETRIES,
+        )
 
     def call(self, client, messages, model, **kwargs):
         """Call Groq chat completions API."""
         return client.chat.completions.create(model=model, messages=messages, **kwargs)
 
+    async def acall(self, client, messages, model, **kwargs):
+        """Call Groq chat completions API without blocking the event loop."""
+        return await client.chat.completions.create(
+            model=model, messages=messages, **kwargs
+        )
+
     def extract(self, response):
         """Extract message content from response."""
         return response["choices"][0]["message"]["content"]
 
+    def call_stream(self, client, messages, model, **kwargs):
+        """Call Groq chat completions API, streaming the response."""
+        return client.chat.completions.create(
+            model=model, messages=messages, stream=True, **kwargs
+        )
+
+    def extract_stream(self, response):
+        """Yield message content deltas from a streamed response."""
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     def format_messages(self, history):
         """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+        return _role_content(history)
 
 
 class CohereChat:
     """Cohere chat provider."""
 
+    _client = None
+    _client_key = None
+
     def client_factory(self):
         """Create Cohere client from COHERE_API_KEY env var."""
-        from cohere import Client
 
-        return Client(api_key=os.environ["COHERE_API_KEY"])
+        def build(key):
+            from cohere import Client
+
+            return Client(api_key=key)
+
+        return _cached_client(self, "COHERE_API_KEY", build)
 
     def call(self, client, messages, model, **kwargs):
         """Call Cohere chat API."""
@@ -154,86 +380,29 @@ class CohereChat:
 
     def format_messages(self, history):
         """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
-
-
-class OpenRouterChatCompletions:
-    """OpenRouter chat completions provider."""
-
-    def client_factory(self):
-        """Create OpenRouter client from OPENROUTER_API_KEY env var."""
-        from openai import OpenAI
-
-        return OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.environ["OPENROUTER_API_KEY"],
-            extra_headers={
-                "HTTP-Referer": "DashAI.chat",
-                "X-Title": "DashAIChat",
-            },
-        )
-
-    def call(self, client, messages, model, **kwargs):
-        """Call OpenRouter chat completions API."""
-        return client.chat.completions.create(model=model, messages=messages, **kwargs)
-
-    def extract(self, response):
-        """Extract message content from response."""
-        return response["choices"][0]["message"]["content"]
-
-    def format_messages(self, history):
-        """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
-
-
-class DeepSeekChatCompletions:
-    """DeepSeek chat completions provider."""
-
-    def client_factory(self):
-        """Create DeepSeek client from DEEPSEEK_API_KEY env var."""
-        from openai import OpenAI
-
-        return OpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=os.environ["DEEPSEEK_API_KEY"],
-        )
-
-    def call(self, client, messages, model, **kwargs):
-        """Call DeepSeek chat completions API."""
-        return client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return _role_content(history)
 
-    def extract(self, response):
-        """Extract message content from response."""
-        return response["choices"][0]["message"]["content"]
 
-    def format_messages(self, history):
-        """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+class OpenRouterChatCompletions(OpenAIChatCompletions):
+    """OpenRouter chat completions provider (OpenAI-compatible API)."""
 
+    api_key_env = "OPENROUTER_API_KEY"
+    base_url = "https://openrouter.ai/api/v1"
+    default_headers = {"HTTP-Referer": "DashAI.chat", "X-Title": "DashAIChat"}
 
-class QwenChatCompletions:
-    """Qwen (Tongyi Qianwen) chat completions provider."""
 
-    def client_factory(self):
-        """Create Qwen client from DASHSCOPE_API_KEY env var."""
-        from openai import OpenAI
+class DeepSeekChatCompletions(OpenAIChatCompletions):
+    """DeepSeek chat completions provider (OpenAI-compatible API)."""
 
-        return OpenAI(
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            api_key=os.environ["DASHSCOPE_API_KEY"],
-        )
+    api_key_env = "DEEPSEEK_API_KEY"
+    base_url = "https://api.deepseek.com/v1"
 
-    def call(self, client, messages, model, **kwargs):
-        """Call Qwen chat completions API."""
-        return client.chat.completions.create(model=model, messages=messages, **kwargs)
 
-    def extract(self, response):
-        """Extract message content from response."""
-        return response["choices"][0]["message"]["content"]
+class QwenChatCompletions(OpenAIChatCompletions):
+    """Qwen (Tongyi Qianwen) chat completions provider (OpenAI-compatible API)."""
 
-    def format_messages(self, history):
-        """Format message history for API."""
-        return [{"role": m["role"], "content": m["content"]} for m in history]
+    api_key_env = "DASHSCOPE_API_KEY"
+    base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
 
 def build_default_registry():
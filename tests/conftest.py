@@ -1,7 +1,8 @@
 import os
+import sys
 import tempfile
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -26,3 +27,24 @@ def app_with_temp_dir(temp_dir):
     from dash_ai_chat import DashAIChat
 
     return DashAIChat(base_dir=temp_dir)
+
+
+@pytest.fixture
+def fake_sdk():
+    """Install fake provider SDK modules, with a clean API key cache.
+
+    Call the fixture with a module name ("openai", "cohere", ...) to get the
+    Mock that `import <name>` returns inside the providers.
+    """
+    from dash_ai_chat import providers
+
+    def install(name):
+        sys.modules[name] = module = Mock()
+        return module
+
+    with (
+        patch.dict("sys.modules"),
+        patch.dict(providers._API_KEYS, clear=True),
+        patch.object(providers, "_shared_http_client"),
+    ):
+        yield install
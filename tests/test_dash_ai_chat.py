@@ -1,9 +1,11 @@
+import asyncio
 import json
 import tempfile
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+from dash import html
 from dash_ai_chat import DashAIChat
 
 
@@ -48,6 +50,21 @@ class TestFileIO:
             assert json.loads(lines[0]) == {"id": 1, "msg": "first"}
             assert json.loads(lines[1]) == {"id": 2, "msg": "second"}
 
+    def test_stdlib_json_fallback(self, app_with_temp_dir, temp_dir):
+        file_path = Path(temp_dir) / "messages.json"
+        jsonl_path = Path(temp_dir) / "raw_api_responses.jsonl"
+        data = [{"role": "user", "content": "مرحبا", "scores": {1: "a"}}]
+        expected = [{"role": "user", "content": "مرحبا", "scores": {"1": "a"}}]
+
+        app_with_temp_dir._write_json(file_path, data)
+        app_with_temp_dir._append_jsonl(jsonl_path, data[0])
+        with patch("dash_ai_chat.dash_ai_chat.orjson", None):
+            assert app_with_temp_dir._read_json(file_path) == expected
+            app_with_temp_dir._write_json(file_path, data)
+            app_with_temp_dir._append_jsonl(jsonl_path, data[0])
+        assert app_with_temp_dir._read_json(file_path) == expected
+        assert list(app_with_temp_dir._read_jsonl(jsonl_path)) == expected * 2
+
     def test_read_jsonl(self, app_with_temp_dir):
         with tempfile.NamedTemporaryFile(mode="w", suffix=".jsonl") as f:
             file_path = Path(f.name)
@@ -66,6 +83,36 @@ class TestFileIO:
             assert result == expected
 
 
+class TestLayoutValidation:
+    def test_set_layout_missing_required_ids(self, app_with_temp_dir):
+        with pytest.raises(ValueError, match="chat_area_div"):
+            app_with_temp_dir.set_layout(html.Div(id="something_else"))
+
+    def test_required_ids_alias(self, app_with_temp_dir):
+        assert app_with_temp_dir.required_ids == DashAIChat.REQUIRED_IDS
+        with pytest.raises(AttributeError):
+            app_with_temp_dir.required_ids = set()
+
+    def test_set_layout_with_pattern_matching_ids(self, app_with_temp_dir):
+        layout = html.Div(
+            [
+                app_with_temp_dir.default_layout(),
+                html.Div(id={"type": "extra", "index": 0}),
+            ]
+        )
+
+        app_with_temp_dir.set_layout(layout)
+        assert app_with_temp_dir.layout is layout
+
+    def test_set_layout_deeply_nested(self, app_with_temp_dir):
+        layout = app_with_temp_dir.default_layout()
+        for _ in range(2000):
+            layout = html.Div(layout)
+
+        app_with_temp_dir.set_layout(layout)
+        assert app_with_temp_dir.layout is layout
+
+
 class TestDirectoryListing:
     def test_get_next_convo_id_empty_user(self, app_with_temp_dir):
         result = app_with_temp_dir.get_next_convo_id("newuser")
@@ -155,6 +202,114 @@ class TestAIProviderInterface:
         )
         assert result == "Hello there!"
 
+    def test_afetch_ai_response(self, app_with_temp_dir):
+        mock_provider = Mock()
+        mock_provider.format_messages.return_value = [
+            {"role": "user", "content": "Hello"}
+        ]
+        mock_provider.async_client_factory.return_value = AsyncMock()
+        mock_provider.acall = AsyncMock(
+            return_value={"choices": [{"message": {"content": "Hello there!"}}]}
+        )
+
+        with patch.dict(
+            app_with_temp_dir.AI_REGISTRY, {"openai:chat.completions": mock_provider}
+        ):
+            result = asyncio.run(
+                app_with_temp_dir.afetch_ai_response(
+                    [{"role": "user", "content": "Hello"}],
+                    provider_spec="openai:chat.completions",
+                    provider_model="gpt-4o",
+                )
+            )
+
+        assert result == {"choices": [{"message": {"content": "Hello there!"}}]}
+        mock_provider.acall.assert_awaited_once_with(
+            mock_provider.async_client_factory.return_value,
+            [{"role": "user", "content": "Hello"}],
+            "gpt-4o",
+        )
+        mock_provider.async_client_factory.return_value.close.assert_awaited_once()
+
+    @patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"})
+    def test_afetch_ai_response_across_event_loops(self, app_with_temp_dir, fake_sdk):
+        clients = []
+
+        def make_async_client(**kwargs):
+            client = AsyncMock()
+            client.chat.completions.create.return_value = {
+                "choices": [{"message": {"content": "Hi"}}]
+            }
+            clients.append(client)
+            return client
+
+        fake_openai = fake_sdk("openai")
+        fake_openai.AsyncOpenAI.side_effect = make_async_client
+        for _ in range(2):
+            result = asyncio.run(
+                app_with_temp_dir.afetch_ai_response(
+                    [{"role": "user", "content": "Hello"}],
+                    provider_spec="openai:chat.completions",
+                    provider_model="gpt-4o",
+                )
+            )
+            assert result == {"choices": [{"message": {"content": "Hi"}}]}
+
+        # Each asyncio.run gets its own client, closed before its loop goes away
+        assert len(clients) == 2
+        for client in clients:
+            client.close.assert_awaited_once()
+        fake_openai.OpenAI.assert_not_called()
+
+    def test_stream_ai_response(self, app_with_temp_dir):
+        mock_provider = Mock()
+        mock_provider.format_messages.return_value = [
+            {"role": "user", "content": "Hello"}
+        ]
+        mock_provider.extract_stream.return_value = iter(["Hel", "lo!"])
+
+        with patch.dict(
+            app_with_temp_dir.AI_REGISTRY, {"openai:chat.completions": mock_provider}
+        ):
+            result = app_with_temp_dir.stream_ai_response(
+                [{"role": "user", "content": "Hello"}],
+                provider_spec="openai:chat.completions",
+                provider_model="gpt-4o",
+            )
+
+            assert "".join(result) == "Hello!"
+            mock_provider.call_stream.assert_called_once_with(
+                mock_provider.client_factory.return_value,
+                [{"role": "user", "content": "Hello"}],
+                "gpt-4o",
+            )
+
+    def test_stream_ai_response_unsupported_provider(self, app_with_temp_dir):
+        mock_provider = Mock(
+            spec=["client_factory", "call", "extract", "format_messages"]
+        )
+
+        with (
+            patch.dict(app_with_temp_dir.AI_REGISTRY, {"custom:chat": mock_provider}),
+            pytest.raises(ValueError, match="does not support streaming"),
+        ):
+            app_with_temp_dir.stream_ai_response(
+                [{"role": "user", "content": "Hello"}],
+                provider_spec="custom:chat",
+                provider_model="custom-model",
+            )
+
+    def test_extract_stream_openai(self, app_with_temp_dir):
+        provider = app_with_temp_dir.AI_REGISTRY["openai:chat.completions"]
+        chunks = [
+            Mock(choices=[Mock(delta=Mock(content="Hel"))]),
+            Mock(choices=[Mock(delta=Mock(content=None))]),
+            Mock(choices=[]),
+            Mock(choices=[Mock(delta=Mock(content="lo!"))]),
+        ]
+
+        assert list(provider.extract_stream(chunks)) == ["Hel", "lo!"]
+
 
 class TestMessageManagement:
     def test_load_messages_nonexistent_conversation(self, app_with_temp_dir):
@@ -537,3 +692,120 @@ class TestProviderConfiguration:
             mock_provider.call.assert_called_once()
             call_args = mock_provider.call.call_args[0]
             assert call_args[2] == "gpt-4o"  # provider_model is 3rd argument
+
+
+class TestProviders:
+    def test_client_factory_reuses_client(self):
+        from dash_ai_chat.providers import OllamaChat
+
+        fake_ollama = Mock()
+        with patch.dict("sys.modules", {"ollama": fake_ollama}):
+            provider = OllamaChat()
+            first = provider.client_factory()
+            second = provider.client_factory()
+
+        assert first is second
+        fake_ollama.Client.assert_called_once_with()
+
+    def test_client_factory_is_per_instance(self):
+        from dash_ai_chat.providers import OllamaChat
+
+        fake_ollama = Mock()
+        fake_ollama.Client.side_effect = lambda: Mock()
+        with patch.dict("sys.modules", {"ollama": fake_ollama}):
+            assert OllamaChat().client_factory() is not OllamaChat().client_factory()
+
+    @patch.dict("os.environ", {"COHERE_API_KEY": "env-key"})
+    def test_set_api_key_rebuilds_client(self, fake_sdk):
+        from dash_ai_chat import providers
+
+        fake_cohere = fake_sdk("cohere")
+        fake_cohere.Client.side_effect = lambda api_key: Mock(api_key=api_key)
+        provider = providers.CohereChat()
+        first = provider.client_factory()
+        assert provider.client_factory() is first
+        assert first.api_key == "env-key"
+
+        providers.set_api_key("COHERE_API_KEY", "new-key")
+        second = provider.client_factory()
+
+        assert second is not first
+        assert second.api_key == "new-key"
+
+    def test_gemini_sends_full_history(self):
+        from dash_ai_chat.providers import GeminiChatCompletions
+
+        provider = GeminiChatCompletions()
+        client = Mock()
+        history = [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello!"},
+            {"role": "user", "content": "What did I say?"},
+        ]
+
+        provider.call(client, provider.format_messages(history), "gemini-2.0-flash")
+
+        client.models.generate_content.assert_called_once_with(
+            model="gemini-2.0-flash",
+            contents=[
+                {"role": "user", "parts": [{"text": "Hi"}]},
+                {"role": "model", "parts": [{"text": "Hello!"}]},
+                {"role": "user", "parts": [{"text": "What did I say?"}]},
+            ],
+        )
+        client.chats.create.assert_not_called()
+
+    def test_format_messages_strips_extra_keys(self):
+        from dash_ai_chat.providers import OpenAIChatCompletions
+
+        provider = OpenAIChatCompletions()
+        clean = [{"role": "user", "content": "Hi"}]
+        extra = clean + [{"role": "assistant", "content": "", "audio_file": "a.mp3"}]
+
+        assert provider.format_messages(clean) is clean
+        assert provider.format_messages(extra) == [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": ""},
+        ]
+
+    @patch.dict("os.environ", {"DEEPSEEK_API_KEY": "test-key"})
+    def test_client_factory_enables_sdk_retries(self, fake_sdk):
+        from dash_ai_chat import providers
+
+        fake_openai = fake_sdk("openai")
+        providers.DeepSeekChatCompletions().client_factory()
+
+        _, kwargs = fake_openai.OpenAI.call_args
+        assert kwargs["max_retries"] == providers.MAX_RETRIES
+
+    def test_registry_provider_methods_can_be_replaced(self, app_with_temp_dir):
+        provider = app_with_temp_dir.AI_REGISTRY["openai:chat.completions"]
+        with patch.object(provider, "call") as mock_call:
+            provider.call(None, [], "gpt-4o")
+        mock_call.assert_called_once_with(None, [], "gpt-4o")
+
+    @patch.dict("os.environ", {"COHERE_API_KEY": "env-key"})
+    def test_subclass_init_need_not_call_super(self, fake_sdk):
+        from dash_ai_chat import providers
+
+        class TaggedCohere(providers.CohereChat):
+            def __init__(self, tag):
+                self.tag = tag
+
+        fake_sdk("cohere")
+        provider = TaggedCohere("prod")
+        assert provider.client_factory() is provider.client_factory()
+
+    @patch.dict("os.environ", {"OPENROUTER_API_KEY": "test-key"})
+    def test_openrouter_sends_default_headers(self, fake_sdk):
+        from dash_ai_chat import providers
+
+        fake_openai = fake_sdk("openai")
+        provider = providers.OpenRouterChatCompletions()
+        provider.client_factory()
+        provider.async_client_factory()
+
+        headers = providers.OpenRouterChatCompletions.default_headers
+        assert fake_openai.OpenAI.call_args.kwargs["default_headers"] == headers
+        assert fake_openai.AsyncOpenAI.call_args.kwargs["default_headers"] == headers
+        assert "extra_headers" not in fake_openai.OpenAI.call_args.kwargs